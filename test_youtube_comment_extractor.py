@@ -0,0 +1,556 @@
+import asyncio
+import csv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import orjson
+import pytest
+from aiohttp import web
+
+import youtube_comment_extractor as yce
+
+
+API_KEY = 'SECRET-API-KEY'
+
+
+def snippet(comment_id):
+    return {
+        'authorDisplayName': f'author of {comment_id}',
+        'textDisplay': f'text of {comment_id}',
+        'likeCount': len(comment_id),
+        'publishedAt': '2024-01-01T00:00:00Z',
+        'updatedAt': '2024-01-02T00:00:00Z',
+    }
+
+
+class FakeYouTube:
+    """
+    Serves commentThreads and comments from in-memory threads on a local port.
+
+    Args:
+        replies (dict): Reply IDs of each thread, by thread ID
+        page_size (int): Threads per commentThreads page
+        reply_page_size (int): Replies per comments page
+        inline_replies (int): Replies returned with each thread
+    """
+
+    def __init__(self, replies, page_size=2, reply_page_size=2, inline_replies=1):
+        self.replies = replies
+        self.page_size = page_size
+        self.reply_page_size = reply_page_size
+        self.inline_replies = inline_replies
+        self.requests = []
+        # Optional hooks returning a response to send instead of the normal page
+        self.thread_hook = None
+        self.reply_hook = None
+        self.repeat_last_reply = False
+
+    async def comment_threads(self, request):
+        query = request.query
+        assert query['key'] == API_KEY
+        self.requests.append(('commentThreads', dict(query)))
+        if self.thread_hook is not None:
+            response = self.thread_hook(query)
+            if response is not None:
+                return response
+
+        thread_ids = list(self.replies)
+        start = int(query.get('pageToken', 0))
+        end = min(start + min(int(query['maxResults']), self.page_size), len(thread_ids))
+        items = []
+        for thread_id in thread_ids[start:end]:
+            item = {'snippet': {
+                'totalReplyCount': len(self.replies[thread_id]),
+                'topLevelComment': {'id': thread_id, 'snippet': snippet(thread_id)},
+            }}
+            if 'replies' in query['part'] and self.replies[thread_id]:
+                item['replies'] = {'comments': [
+                    {'id': reply_id, 'snippet': snippet(reply_id)}
+                    for reply_id in self.replies[thread_id][:self.inline_replies]
+                ]}
+            items.append(item)
+        body = {'items': items}
+        if end < len(thread_ids):
+            body['nextPageToken'] = str(end)
+        return web.json_response(body)
+
+    async def comments(self, request):
+        query = request.query
+        assert query['key'] == API_KEY
+        self.requests.append(('comments', dict(query)))
+        if self.reply_hook is not None:
+            response = self.reply_hook(query)
+            if response is not None:
+                return response
+
+        reply_ids = self.replies[query['parentId']]
+        start = int(query.get('pageToken', 0))
+        # Optionally repeat the previous page's last reply, as if one was posted mid-pagination
+        first = start - 1 if self.repeat_last_reply and start else start
+        end = min(start + self.reply_page_size, len(reply_ids))
+        body = {'items': [{'id': reply_id, 'snippet': snippet(reply_id)} for reply_id in reply_ids[first:end]]}
+        if end < len(reply_ids):
+            body['nextPageToken'] = str(end)
+        return web.json_response(body)
+
+    def count(self, endpoint):
+        return sum(1 for name, _ in self.requests if name == endpoint)
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """
+    Runs a FakeYouTube server in a background event loop and points API_BASE at it,
+    so the code under test can run its own event loop.
+    """
+    api = FakeYouTube({
+        't0': [],
+        't1': ['t1.r0', 't1.r1', 't1.r2', 't1.r3', 't1.r4'],
+        't2': ['t2.r0'],
+        't3': ['t3.r0', 't3.r1', 't3.r2'],
+        't4': [],
+    })
+    app = web.Application()
+    app.add_routes([
+        web.get('/youtube/v3/commentThreads', api.comment_threads),
+        web.get('/youtube/v3/comments', api.comments),
+    ])
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def start():
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        return runner, runner.addresses[0][1]
+
+    runner, port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    monkeypatch.setattr(yce, 'API_BASE', f'http://127.0.0.1:{port}/youtube/v3')
+    yield api
+
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def api_error(status, reason):
+    return web.json_response({'error': {'errors': [{'reason': reason}]}}, status=status)
+
+
+def client_get(endpoint, requests_per_second=100, **params):
+    async def run():
+        async with yce.new_session() as session:
+            client = yce.YouTubeClient(API_KEY, session, requests_per_second=requests_per_second)
+            return await client.get(endpoint, **params)
+    return asyncio.run(run())
+
+
+def collect(**kwargs):
+    async def run():
+        return [comment async for comment in yce.get_video_comments(API_KEY, 'video', **kwargs)]
+    return asyncio.run(run())
+
+
+async def stream(comments):
+    for comment in comments:
+        yield comment
+
+
+def test_pagination_with_replies(fake_api):
+    comments = collect(max_results=100, include_replies=True)
+
+    assert [c['comment_id'] for c in comments] == [
+        't0',
+        't1', 't1.r0', 't1.r1', 't1.r2', 't1.r3', 't1.r4',
+        't2', 't2.r0',
+        't3', 't3.r0', 't3.r1', 't3.r2',
+        't4',
+    ]
+    assert [c['level'] for c in comments[:3]] == [0, 0, 1]
+    assert comments[2]['parent_id'] == 't1'
+    assert comments[0]['parent_id'] == ''
+    assert fake_api.count('commentThreads') == 3
+    assert fake_api.count('comments') == 5
+
+
+def test_max_results_caps_threads(fake_api):
+    comments = collect(max_results=3, include_replies=True)
+
+    assert [c['comment_id'] for c in comments if c['level'] == 0] == ['t0', 't1', 't2']
+    assert [query.get('maxResults') for name, query in fake_api.requests if name == 'commentThreads'] == ['3', '1']
+
+
+def test_top_level_comments_only_by_default(fake_api):
+    comments = collect(max_results=3)
+
+    assert [c['comment_id'] for c in comments] == ['t0', 't1', 't2']
+    assert fake_api.count('comments') == 0
+    for _, query in fake_api.requests:
+        assert (query['part'], query['fields']) == ('snippet', yce.TOP_LEVEL_FIELDS)
+
+
+def test_reply_fetches_follow_the_shared_client_rate(fake_api):
+    # Both threads with more replies on one page, so their reply fetches start together
+    fake_api.page_size = 5
+
+    async def run():
+        async with yce.new_session() as session:
+            client = yce.YouTubeClient(API_KEY, session, requests_per_second=100)
+            started = time.monotonic()
+            # requests_per_second only applies to a new client, so it must not slow this one down
+            comments = [comment async for comment in yce.get_video_comments(
+                API_KEY, 'video', requests_per_second=0.5, client=client, include_replies=True
+            )]
+            return comments, time.monotonic() - started
+
+    comments, elapsed = asyncio.run(run())
+
+    assert len(comments) == 14
+    assert elapsed < 1.5
+
+
+def test_reply_repeated_across_pages_is_kept_once(fake_api):
+    fake_api.repeat_last_reply = True
+
+    comments = collect(max_results=100, include_replies=True)
+
+    ids = [c['comment_id'] for c in comments]
+    assert len(ids) == len(set(ids)) == 14
+    assert ids[1:7] == ['t1', 't1.r0', 't1.r1', 't1.r2', 't1.r3', 't1.r4']
+
+
+def test_closing_the_stream_settles_the_prefetched_page(fake_api, monkeypatch):
+    tasks = []
+    create_task = asyncio.create_task
+
+    def record_task(coro, **kwargs):
+        tasks.append(create_task(coro, **kwargs))
+        return tasks[-1]
+    monkeypatch.setattr(yce.asyncio, 'create_task', record_task)
+
+    async def run():
+        comments = yce.get_video_comments(API_KEY, 'video', max_results=100)
+        await comments.__anext__()
+        await comments.aclose()
+        return [(task.cancelled() or task.exception()) for task in tasks if task.get_coro().__qualname__ == 'YouTubeClient.get']
+
+    assert asyncio.run(run()) == [True]
+
+
+def test_partial_responses_are_requested(fake_api):
+    collect(max_results=100, include_replies=True)
+
+    fields = {'commentThreads': yce.THREAD_FIELDS, 'comments': yce.REPLY_FIELDS}
+    for endpoint, query in fake_api.requests:
+        assert query['fields'] == fields[endpoint]
+        assert query['prettyPrint'] == 'false'
+    assert fake_api.count('comments') == 5
+
+
+def test_cached_responses_skip_the_network(fake_api, tmp_path):
+    pytest.importorskip('diskcache')
+    cache = yce.open_cache(str(tmp_path / 'cache'))
+    try:
+        first = collect(max_results=100, cache=cache, include_replies=True)
+        requests = len(fake_api.requests)
+        second = collect(max_results=100, cache=cache, include_replies=True)
+    finally:
+        cache.close()
+
+    assert second == first
+    assert len(fake_api.requests) == requests == 8
+
+
+def test_rate_limited_request_is_retried(fake_api):
+    failures = [api_error(403, 'rateLimitExceeded')]
+    fake_api.thread_hook = lambda query: failures.pop() if failures else None
+
+    response = client_get('commentThreads', part='snippet', videoId='video', maxResults=2)
+
+    assert len(response['items']) == 2
+    assert fake_api.count('commentThreads') == 2
+
+
+def test_quota_exceeded_is_not_retried(fake_api):
+    fake_api.thread_hook = lambda query: api_error(403, 'quotaExceeded')
+
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        client_get('commentThreads', part='snippet', videoId='video', maxResults=2)
+
+    assert (error.value.status, error.value.message) == (403, 'quotaExceeded')
+    assert fake_api.count('commentThreads') == 1
+
+
+def test_rate_below_one_request_per_second(fake_api):
+    async def run():
+        async with yce.new_session() as session:
+            client = yce.YouTubeClient(API_KEY, session, requests_per_second=0.5)
+            started = time.monotonic()
+            for _ in range(2):
+                await client.get('commentThreads', part='snippet', videoId='video', maxResults=2)
+            return time.monotonic() - started
+
+    # The second request waits for the next 2 second slot
+    assert asyncio.run(run()) >= 1.5
+    assert fake_api.count('commentThreads') == 2
+
+
+def test_adaptive_rate_stays_within_configured_rate():
+    client = yce.YouTubeClient(API_KEY, session=None, requests_per_second=0.5)
+
+    for _ in range(10):
+        client._adapt_rate({'X-RateLimit-Remaining': '0'})
+    assert client.rate == 0.5 * yce.MIN_RATE_FRACTION
+    assert client.limiter.time_period == 1 / client.rate
+
+    for _ in range(10):
+        client._adapt_rate({'X-RateLimit-Remaining': '100'})
+    assert client.rate == 0.5
+    assert (client.limiter.max_rate, client.limiter.time_period) == (1, 2)
+
+
+def test_server_error_is_retried(fake_api):
+    failures = [web.Response(status=503)]
+    fake_api.thread_hook = lambda query: failures.pop() if failures else None
+
+    comments = collect(max_results=100)
+
+    assert len(comments) == 5
+    assert fake_api.count('commentThreads') == 4
+
+
+def test_not_found_mid_run_keeps_partial_file(fake_api, tmp_path):
+    fake_api.thread_hook = lambda query: web.Response(status=404) if 'pageToken' in query else None
+    filename = tmp_path / 'out.jsonl'
+
+    count = yce.run_one(API_KEY, 'video', 100, 100, 'jsonl', str(filename), include_replies=True)
+
+    assert count == 0
+    assert not filename.exists()
+    partial = tmp_path / 'out.partial.jsonl'
+    assert [orjson.loads(line)['comment_id'] for line in partial.read_bytes().splitlines()] == [
+        't0', 't1', 't1.r0', 't1.r1', 't1.r2', 't1.r3', 't1.r4'
+    ]
+
+
+def test_not_found_on_first_page_leaves_no_file(fake_api, tmp_path):
+    fake_api.thread_hook = lambda query: web.Response(status=404)
+
+    count = yce.run_one(API_KEY, 'video', 100, 100, 'csv', str(tmp_path / 'out.csv'))
+
+    assert count == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_invalid_page_keeps_partial_file(fake_api, tmp_path, capsys):
+    fake_api.thread_hook = lambda query: (
+        web.Response(text='<html></html>', content_type='text/html') if 'pageToken' in query else None
+    )
+
+    count = yce.run_one(API_KEY, 'video', 100, 100, 'csv', str(tmp_path / 'out.csv'))
+
+    assert count == 0
+    assert [path.name for path in tmp_path.iterdir()] == ['out.partial.csv']
+    assert 'An error occurred: JSONDecodeError' in capsys.readouterr().out
+
+
+def test_write_error_is_reported(fake_api, tmp_path, capsys):
+    count = yce.run_one(API_KEY, 'video', 100, 100, 'csv', str(tmp_path / 'missing' / 'out.csv'))
+
+    assert count == 0
+    assert 'Error saving to CSV: ' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('failing_query', [
+    lambda query: True,
+    lambda query: 'pageToken' in query,
+], ids=['first page fails', 'second page fails'])
+def test_failed_run_keeps_existing_output(fake_api, tmp_path, failing_query):
+    fake_api.thread_hook = lambda query: api_error(403, 'quotaExceeded') if failing_query(query) else None
+    filename = tmp_path / 'out.jsonl'
+    filename.write_bytes(b'earlier run\n')
+
+    count = yce.run_one(API_KEY, 'video', 100, 100, 'jsonl', str(filename))
+
+    assert count == 0
+    assert filename.read_bytes() == b'earlier run\n'
+    assert not (tmp_path / 'out.jsonl.tmp').exists()
+
+
+def test_unwritable_temp_file_keeps_existing_output(fake_api, tmp_path, capsys):
+    filename = tmp_path / 'out.jsonl'
+    filename.write_bytes(b'earlier run\n')
+    (tmp_path / 'out.jsonl.tmp').mkdir()
+
+    count = yce.run_one(API_KEY, 'video', 100, 100, 'jsonl', str(filename))
+
+    assert count == 0
+    assert filename.read_bytes() == b'earlier run\n'
+    assert 'Error saving to JSONL: ' in capsys.readouterr().out
+
+
+def test_complete_run_replaces_existing_output(fake_api, tmp_path):
+    filename = tmp_path / 'out.jsonl'
+    filename.write_bytes(b'earlier run\n')
+
+    count = yce.run_one(API_KEY, 'video', 100, 100, 'jsonl', str(filename))
+
+    assert count == 5
+    assert len(filename.read_bytes().splitlines()) == 5
+    assert [path.name for path in tmp_path.iterdir()] == ['out.jsonl']
+
+
+def test_reply_errors_do_not_print_api_key(fake_api, capsys):
+    fake_api.reply_hook = lambda query: web.Response(status=404)
+
+    comments = collect(max_results=100, include_replies=True)
+
+    # The inline replies are kept; the rest of the thread is skipped with a warning
+    assert [c['comment_id'] for c in comments][1:3] == ['t1', 't1.r0']
+    output = capsys.readouterr().out
+    assert 'Could not fetch all replies for comment t1: 404' in output
+    assert API_KEY not in output
+
+
+@pytest.mark.parametrize('rate', [0, -1])
+def test_non_positive_rate_is_rejected(rate):
+    with pytest.raises(ValueError):
+        yce.YouTubeClient(API_KEY, session=None, requests_per_second=rate)
+
+
+def record(comment_id, level=0, parent_id='', comment=None):
+    return {
+        'level': level,
+        'author': f'author of {comment_id}',
+        'comment': comment if comment is not None else f'text of {comment_id}',
+        'like_count': len(comment_id),
+        'published_at': '2024-01-01T00:00:00Z',
+        'updated_at': '2024-01-02T00:00:00Z',
+        'parent_id': parent_id,
+        'comment_id': comment_id,
+    }
+
+
+def test_csv_file_contents(tmp_path):
+    comments = [record('t0', comment='commas, "quotes"\nand newlines'), record('t0.r0', level=1, parent_id='t0')]
+    filename = tmp_path / 'out.csv'
+
+    count = asyncio.run(yce.save_comments_to_csv(stream(comments), 'video', str(filename)))
+
+    assert count == 2
+
+    with open(filename, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        assert reader.fieldnames == list(comments[0])
+        rows = list(reader)
+    assert rows == [{key: str(value) for key, value in comment.items()} for comment in comments]
+
+
+def test_jsonl_file_contents(tmp_path):
+    comments = [record('t0', comment='unicode \u00e9\U0001f600 and\nnewlines'), record('t0.r0', level=1, parent_id='t0')]
+    filename = tmp_path / 'out.jsonl'
+
+    count = asyncio.run(yce.save_comments_to_jsonl(stream(comments), 'video', str(filename)))
+
+    assert count == 2
+    lines = filename.read_bytes().splitlines()
+    assert [orjson.loads(line) for line in lines] == comments
+
+
+def test_parquet_schema(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    comments = [record('t0'), record('t0.r0', level=1, parent_id='t0')]
+    filename = tmp_path / 'out.parquet'
+
+    count = asyncio.run(yce.save_comments_to_parquet(stream(comments), 'video', str(filename)))
+
+    table = pq.read_table(filename)
+    assert count == table.num_rows == 2
+    assert table.schema.names == yce.FIELDNAMES
+    assert [str(field.type) for field in table.schema] == [
+        'int8', 'string', 'string', 'int64', 'string', 'string', 'string', 'string'
+    ]
+    assert table.to_pylist() == comments
+
+
+def test_no_comments_leave_no_file(tmp_path):
+    filename = tmp_path / 'out.csv'
+
+    count = asyncio.run(yce.save_comments_to_csv(stream([]), 'video', str(filename)))
+
+    assert count == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parquet_row_groups(tmp_path, monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    monkeypatch.setattr(yce, 'PARQUET_ROW_GROUP_SIZE', 2)
+    comments = [record(f't{i}', level=i % 2, parent_id=f't{i - 1}' if i % 2 else '') for i in range(5)]
+    filename = tmp_path / 'out.parquet'
+
+    asyncio.run(yce.save_comments_to_parquet(stream(comments), 'video', str(filename)))
+
+    parquet_file = pq.ParquetFile(filename)
+    assert [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)] == [2, 2, 1]
+    assert parquet_file.read().to_pylist() == comments
+
+
+def test_read_video_ids(tmp_path):
+    filename = tmp_path / 'ids.txt'
+    filename.write_text('# videos\nvideo1\n\n  video2  \n  # skipped\nvideo3\n', encoding='utf-8')
+
+    assert yce.read_video_ids(str(filename)) == ['video1', 'video2', 'video3']
+
+
+@pytest.fixture
+def threaded_pool(monkeypatch, tmp_path):
+    """
+    Runs run_many's workers as threads, so they see the patched API_BASE, in a
+    scratch directory for their output files.
+    """
+    monkeypatch.setattr(yce, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(yce.os, 'cpu_count', lambda: 16)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_run_many_saves_one_file_per_video(fake_api, threaded_pool):
+    fake_api.thread_hook = lambda query: web.Response(status=404) if query['videoId'] == 'bad' else None
+
+    failed = yce.run_many(API_KEY, ['video1', 'bad', 'video2'], 100, 100, 'jsonl', include_replies=True)
+
+    assert failed == ['bad']
+    for video_id in ('video1', 'video2'):
+        lines = (threaded_pool / f'youtube_comments_{video_id}.jsonl').read_bytes().splitlines()
+        assert len(lines) == 14
+    # A video that failed on its first page leaves no file behind
+    assert len(list(threaded_pool.iterdir())) == 2
+
+
+def test_run_many_with_more_workers_than_requests_per_second(fake_api, threaded_pool):
+    # Three workers share 2 requests per second, so each one gets less than one per second
+    failed = yce.run_many(API_KEY, ['video1', 'video2', 'video3'], 1, 2, 'csv')
+
+    assert failed == []
+    assert sorted(path.name for path in threaded_pool.iterdir()) == [
+        'youtube_comments_video1.csv', 'youtube_comments_video2.csv', 'youtube_comments_video3.csv'
+    ]
+
+
+def test_run_many_removes_temp_file_of_crashed_worker(threaded_pool, monkeypatch):
+    def crash(api_key, video_id, *args):
+        # Stands in for a worker process that died halfway through writing its file
+        (threaded_pool / f'youtube_comments_{video_id}.jsonl.tmp').write_bytes(b'{}\n')
+        raise RuntimeError('worker died')
+    monkeypatch.setattr(yce, 'run_one', crash)
+
+    failed = yce.run_many(API_KEY, ['video1'], 100, 100, 'jsonl')
+
+    assert failed == ['video1']
+    assert list(threaded_pool.iterdir()) == []
@@ -1,279 +1,811 @@
 #!/usr/bin/env python3
 
+import os
 import csv
 import sys
+import asyncio
 import argparse
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from array import array
+from contextlib import AsyncExitStack
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import aiohttp
+import aiometer
+import orjson
+from aiolimiter import AsyncLimiter
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
 
-def get_video_comments(api_key, video_id, max_results=100):
+API_BASE = 'https://www.googleapis.com/youtube/v3'
+MAX_IN_FLIGHT = 64
+MAX_REPLY_FETCHERS = 32
+REQUESTS_PER_SECOND = 10
+# 403 reasons that mean "slow down" rather than "out of quota" or "forbidden"
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Seconds before a single API request is abandoned (and retried)
+REQUEST_TIMEOUT = 60
+# Throttle once the server reports this many requests (or fewer) left in its window
+RATE_LIMIT_LOW_WATER = 5
+# Lowest fraction of the configured rate that throttling may go down to
+MIN_RATE_FRACTION = 1 / 16
+WRITE_BUFFER_SIZE = 1 << 20
+# Partial responses: only request the fields the records are built from
+COMMENT_FIELDS = 'id,snippet(authorDisplayName,textDisplay,likeCount,publishedAt,updatedAt)'
+THREAD_FIELDS = f'nextPageToken,items(snippet(totalReplyCount,topLevelComment({COMMENT_FIELDS})),replies/comments({COMMENT_FIELDS}))'
+TOP_LEVEL_FIELDS = f'nextPageToken,items(snippet(topLevelComment({COMMENT_FIELDS})))'
+REPLY_FIELDS = f'nextPageToken,items({COMMENT_FIELDS})'
+# Records buffered between the fetchers and the file writer
+WRITE_QUEUE_SIZE = 1000
+# Records per Parquet row group, i.e. how many rows are held in column buffers at once
+PARQUET_ROW_GROUP_SIZE = 50000
+# Seconds a cached API response stays valid
+CACHE_TTL = 600
+FIELDNAMES = ['level', 'author', 'comment', 'like_count', 'published_at', 'updated_at', 'parent_id', 'comment_id']
+
+
+def is_retryable(error):
+    """
+    Tells whether a failed request is worth retrying: rate limiting (429, 403 rateLimitExceeded),
+    transient server errors (5xx), dropped connections and timeouts. Everything else, notably
+    403 quotaExceeded and 404, is fatal.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES or (error.status == 403 and error.message in RATE_LIMIT_REASONS)
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+
+def describe_error(error):
+    """
+    Describes a failed request for messages. HTTP errors are reduced to their status and
+    API reason, because their str() and repr() include the request URL and with it the API key.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return f"{error.status} {error.message}"
+    return repr(error)
+
+
+def is_quota_exceeded(error):
+    """
+    Tells whether an exception reports that the daily API quota is used up.
+    """
+    return isinstance(error, aiohttp.ClientResponseError) and error.status == 403 and error.message == 'quotaExceeded'
+
+
+def limiter_settings(requests_per_second):
+    """
+    Expresses a request rate as AsyncLimiter (max_rate, time_period) settings.
+    Rates below one request per second become one request per 1/rate seconds,
+    since the limiter cannot hand out a request while its capacity is below 1.
     """
-    Extracts comments from a YouTube video using the YouTube Data API.
-    Includes both top-level comments and their replies.
-    
+    if requests_per_second >= 1:
+        return requests_per_second, 1
+    return 1, 1 / requests_per_second
+
+
+async def error_reason(response):
+    """
+    Extracts the API error reason (e.g. quotaExceeded) from an error response, if any.
+    """
+    try:
+        body = await response.json(loads=orjson.loads, content_type=None)
+        return body['error']['errors'][0]['reason']
+    except Exception:
+        return None
+
+
+class YouTubeClient:
+    """
+    Thin async wrapper around the YouTube Data API REST endpoints.
+    Bounds the number of requests in flight with a semaphore, paces them with a
+    token bucket and retries rate-limited and transient failures (see is_retryable)
+    with jittered exponential backoff. Raw response bodies can be kept in an
+    on-disk cache so reruns over the same pages skip the network.
+
+    Args:
+        api_key (str): YouTube Data API key
+        session (aiohttp.ClientSession): Session used for all requests
+        max_in_flight (int): Maximum number of concurrent requests
+        requests_per_second (float): Maximum request rate
+        cache (diskcache.Cache): Optional response cache
+        cache_ttl (float): Seconds a cached response stays valid
+    """
+
+    def __init__(self, api_key, session, max_in_flight=MAX_IN_FLIGHT, requests_per_second=REQUESTS_PER_SECOND,
+                 cache=None, cache_ttl=CACHE_TTL):
+        self.api_key = api_key
+        self.session = session
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        if requests_per_second <= 0:
+            raise ValueError(f"requests_per_second must be positive, got {requests_per_second}")
+        self.requests_per_second = requests_per_second
+        self.rate = requests_per_second
+        self.limiter = AsyncLimiter(*limiter_settings(requests_per_second))
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+
+    async def get(self, endpoint, **params):
+        # The API key is left out of the cache key: it does not change the response
+        cache_key = (endpoint, tuple(sorted(params.items())))
+        if self.cache is not None:
+            body = self.cache.get(cache_key)
+            if body is not None:
+                return orjson.loads(body)
+
+        params['key'] = self.api_key
+        params['prettyPrint'] = 'false'
+        retrying = AsyncRetrying(
+            retry=retry_if_exception(is_retryable),
+            wait=wait_exponential_jitter(1, 60),
+            stop=stop_after_attempt(6),
+            reraise=True
+        )
+        async for attempt in retrying:
+            with attempt:
+                body = await self._get_once(endpoint, params)
+
+        if self.cache is not None:
+            self.cache.set(cache_key, body, expire=self.cache_ttl)
+        return orjson.loads(body)
+
+    async def _get_once(self, endpoint, params):
+        async with self.semaphore, self.limiter:
+            async with self.session.get(f"{API_BASE}/{endpoint}", params=params) as response:
+                self._adapt_rate(response.headers)
+                if response.status >= 400:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info,
+                        response.history,
+                        status=response.status,
+                        message=await error_reason(response) or response.reason,
+                        headers=response.headers
+                    )
+                return await response.read()
+
+    def _adapt_rate(self, headers):
+        """
+        Halves the request rate when the server says its rate-limit window is nearly used up,
+        down to MIN_RATE_FRACTION of the configured rate, and doubles it back towards the
+        configured rate once there is headroom again. The new rate takes effect through a
+        fresh limiter; requests already waiting on the old one keep its pace.
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None or not remaining.isdigit():
+            return
+        if int(remaining) <= RATE_LIMIT_LOW_WATER:
+            rate = max(self.requests_per_second * MIN_RATE_FRACTION, self.rate / 2)
+        else:
+            rate = min(self.requests_per_second, self.rate * 2)
+        if rate != self.rate:
+            self.rate = rate
+            self.limiter = AsyncLimiter(*limiter_settings(rate))
+
+
+def new_session():
+    """
+    Creates an aiohttp session with a keep-alive connection pool sized for MAX_IN_FLIGHT.
+    Every request goes to the same host, so once the pool is warm no request pays
+    for a new TCP/TLS handshake; DNS answers are cached for the whole run.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=MAX_IN_FLIGHT,
+        limit_per_host=MAX_IN_FLIGHT,
+        keepalive_timeout=60,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+
+def _record_top(item):
+    """
+    Builds the level 0 comment dictionary for a commentThread resource.
+    """
+    top_level_comment = item['snippet']['topLevelComment']
+    top_comment = top_level_comment['snippet']
+    return {
+        'level': 0,
+        'author': sys.intern(top_comment['authorDisplayName']),
+        'comment': top_comment['textDisplay'],
+        'like_count': top_comment['likeCount'],
+        'published_at': top_comment['publishedAt'],
+        'updated_at': top_comment['updatedAt'],
+        'parent_id': '',
+        'comment_id': top_level_comment['id']
+    }
+
+
+def _record_reply(reply, parent_id):
+    """
+    Builds the level 1 comment dictionary for a reply comment resource.
+    Author names and parent IDs repeat across replies, so they are interned to share one string.
+    """
+    reply_snippet = reply['snippet']
+    return {
+        'level': 1,
+        'author': sys.intern(reply_snippet['authorDisplayName']),
+        'comment': reply_snippet['textDisplay'],
+        'like_count': reply_snippet['likeCount'],
+        'published_at': reply_snippet['publishedAt'],
+        'updated_at': reply_snippet['updatedAt'],
+        'parent_id': sys.intern(parent_id),
+        'comment_id': reply['id']
+    }
+
+
+async def paginate(client, parent_id):
+    """
+    Yields every reply of a comment thread, following nextPageToken.
+
+    Args:
+        client (YouTubeClient): API client
+        parent_id (str): ID of the top-level comment
+    """
+    params = {'part': 'snippet', 'parentId': parent_id, 'maxResults': 100, 'fields': REPLY_FIELDS}
+    while True:
+        replies_response = await client.get('comments', **params)
+        for reply in replies_response['items']:
+            yield reply
+
+        # Handle pagination for replies if needed
+        if 'nextPageToken' not in replies_response:
+            return
+        params['pageToken'] = replies_response['nextPageToken']
+
+
+async def fetch_replies(client, parent_id, seen_ids):
+    """
+    Fetches every reply of a comment thread, skipping the ones already known.
+
+    Args:
+        client (YouTubeClient): API client
+        parent_id (str): ID of the top-level comment
+        seen_ids (set): Reply IDs already returned with the thread; updated with every
+            reply fetched, so a reply repeated across pages is only kept once
+
+    Returns:
+        tuple: The parent ID and its list of reply comment dictionaries (level 1)
+    """
+    replies = []
+
+    try:
+        async for reply in paginate(client, parent_id):
+            if reply['id'] not in seen_ids:
+                seen_ids.add(reply['id'])
+                replies.append(_record_reply(reply, parent_id))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as reply_error:
+        # Running out of quota stops the whole extraction, not just this thread
+        if is_quota_exceeded(reply_error):
+            raise
+        print(f"Warning: Could not fetch all replies for comment {parent_id}: {describe_error(reply_error)}")
+
+    return parent_id, replies
+
+
+async def get_video_comments(api_key, video_id, max_results=100, requests_per_second=REQUESTS_PER_SECOND, client=None,
+                             cache=None, include_replies=False):
+    """
+    Streams comments from a YouTube video using the YouTube Data API, one page at a time.
+    Includes the top-level comments and, if requested, their replies.
+    The threads of each page whose replies did not all come inline are drained by
+    a bounded pool of reply fetchers while the next page is being requested.
+
     Args:
         api_key (str): YouTube Data API key
         video_id (str): YouTube video ID
         max_results (int): Maximum number of comment threads to retrieve
-    
+        requests_per_second (float): Maximum API request rate
+        client (YouTubeClient): Optional client to reuse, e.g. across several videos, so its
+            connection pool and rate limiter are shared; api_key, requests_per_second
+            and cache only apply when a new one is created
+        cache (diskcache.Cache): Optional on-disk cache of raw API responses
+        include_replies (bool): Also retrieve the replies (level 1) of every thread
+
+    Yields:
+        dict: Comment dictionaries with level information, each thread followed by its replies
+
+    Raises:
+        aiohttp.ClientResponseError: On a fatal API error (e.g. 403 quotaExceeded, 404), or
+            once retries of a rate-limited or transient failure are exhausted
+        aiohttp.ClientError, asyncio.TimeoutError: When the API cannot be reached
+    """
+    thread_count = 0
+    next_page = None
+
+    async def settle_next_page():
+        # Cancel a prefetched page nobody will read and wait for it, so it neither runs
+        # against a closed session nor leaves an error behind that nobody retrieves
+        if next_page is not None:
+            next_page.cancel()
+            await asyncio.wait([next_page])
+            if not next_page.cancelled():
+                next_page.exception()
+
+    async with AsyncExitStack() as stack:
+        if client is None:
+            session = await stack.enter_async_context(new_session())
+            client = YouTubeClient(api_key, session, requests_per_second=requests_per_second, cache=cache)
+        # Pushed after the session, so it runs before the session is closed
+        stack.push_async_callback(settle_next_page)
+        params = {
+            'part': 'snippet,replies' if include_replies else 'snippet',
+            'videoId': video_id,
+            'maxResults': min(max_results, 100),
+            'order': 'relevance',
+            'fields': THREAD_FIELDS if include_replies else TOP_LEVEL_FIELDS
+        }
+        response = await client.get('commentThreads', **params)
+
+        while True:
+            items = response['items']
+            thread_count += len(items)
+
+            # Request the next page while this page's replies are being fetched
+            if 'nextPageToken' in response and thread_count < max_results:
+                params['maxResults'] = min(max_results - thread_count, 100)
+                params['pageToken'] = response['nextPageToken']
+                next_page = asyncio.create_task(client.get('commentThreads', **params))
+            else:
+                next_page = None
+
+            # If there are more replies than what came with the thread, fetch them
+            existing_reply_ids = {}
+            if include_replies:
+                for item in items:
+                    replies = item.get('replies', {}).get('comments', ())
+                    if item['snippet']['totalReplyCount'] > len(replies):
+                        existing_reply_ids[item['snippet']['topLevelComment']['id']] = {r['id'] for r in replies}
+            fetched_replies = {}
+            if existing_reply_ids:
+                async with aiometer.amap(
+                    lambda parent_id: fetch_replies(client, parent_id, existing_reply_ids[parent_id]),
+                    list(existing_reply_ids),
+                    max_at_once=MAX_REPLY_FETCHERS
+                ) as results:
+                    async for parent_id, replies in results:
+                        fetched_replies[parent_id] = replies
+
+            for item in items:
+                parent_id = item['snippet']['topLevelComment']['id']
+                replies = item.get('replies', {}).get('comments', ())
+
+                # Add top-level comment (level 0)
+                yield _record_top(item)
+
+                # Add replies (level 1): those that came with the commentThread, then the fetched rest
+                for reply in replies:
+                    yield _record_reply(reply, parent_id)
+                for reply in fetched_replies.get(parent_id, ()):
+                    yield reply
+
+            # Handle pagination if there are more comments
+            if next_page is None:
+                break
+            response = await next_page
+
+
+class OutputError(Exception):
+    """
+    Raised when the output file cannot be opened, written or closed, as opposed to
+    errors raised while retrieving the comments.
+    """
+
+
+def default_filename(video_id, output_format):
+    """
+    Returns the output filename used for a video when none is given.
+    """
+    return f"youtube_comments_{video_id}.{output_format}"
+
+
+def temp_filename(filename):
+    """
+    Returns the name an output file is written under until it is complete.
+    """
+    return f"{filename}.tmp"
+
+
+def keep_partial(temp, filename, count):
+    """
+    Moves the temporary file of a failed extraction to <name>.partial<ext> next to filename,
+    so the comments retrieved so far are preserved without passing for a complete result.
+    The temporary file is removed instead if no comments were written to it.
+    """
+    if not count:
+        os.remove(temp)
+        return
+    root, ext = os.path.splitext(filename)
+    partial = f"{root}.partial{ext}"
+    os.replace(temp, partial)
+    print(f"Comments written before the error were kept in {partial}")
+
+
+async def write_from_queue(queue, write):
+    """
+    Writes records taken from a queue until it receives None.
+
+    Args:
+        queue (asyncio.Queue): Queue of records, terminated by None
+        write (callable): Function writing a single record
+
+    Returns:
+        int: Number of records written
+    """
+    count = 0
+    try:
+        while (record := await queue.get()) is not None:
+            write(record)
+            count += 1
+    except BaseException:
+        # Make room so a producer blocked on put() can notice the writer is gone
+        while not queue.empty():
+            queue.get_nowait()
+        raise
+    return count
+
+
+async def stream_to_writer(comments, write):
+    """
+    Feeds an async iterable of comments to a single writer task through a bounded queue,
+    so the producers are held back whenever the writer falls behind.
+    If the comments stop with an error, the records already queued are still written
+    before the error is passed on.
+
+    Args:
+        comments (async iterable): Comment dictionaries
+        write (callable): Function writing a single record
+
+    Returns:
+        int: Number of records written
+
+    Raises:
+        OutputError: If writing a record fails
+    """
+    queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer_task = asyncio.create_task(write_from_queue(queue, write))
+    try:
+        try:
+            async for comment in comments:
+                if writer_task.done():
+                    break
+                await queue.put(comment)
+        finally:
+            if not writer_task.done():
+                await queue.put(None)
+                await asyncio.wait([writer_task])
+        try:
+            return writer_task.result()
+        except Exception as e:
+            raise OutputError(e) from e
+    finally:
+        writer_task.cancel()
+
+
+async def save_stream(comments, filename, label, open_sink):
+    """
+    Streams comments into a temporary file next to the output file (see temp_filename)
+    and settles it: it is renamed to filename once complete, removed if no comments were
+    written, and kept as a partial file (see keep_partial) if the extraction failed.
+    An existing file named filename is only ever replaced by a complete one.
+
+    Args:
+        comments (async iterable): Comment dictionaries
+        filename (str): Output filename
+        label (str): Name of the output format, for messages
+        open_sink (callable): Opens the file and returns a (write, close) pair, where
+            write writes a single record and close finishes the file
+
     Returns:
-        list: List of comment dictionaries with level information
+        int: Number of comments saved, 0 if the file could not be written
+
+    Raises:
+        Exception: Whatever stopped the comments, once the partial file is kept
     """
-    youtube = build('youtube', 'v3', developerKey=api_key)
-    comments = []
-    
+    written = 0
+
+    def write_counted(comment):
+        nonlocal written
+        write(comment)
+        written += 1
+
+    temp = temp_filename(filename)
     try:
-        # Get video comments with replies
-        request = youtube.commentThreads().list(
-            part='snippet,replies',
-            videoId=video_id,
-            maxResults=max_results,
-            order='relevance'
+        try:
+            write, close = open_sink(temp)
+        except Exception as e:
+            raise OutputError(e) from e
+        try:
+            await stream_to_writer(comments, write_counted)
+        finally:
+            try:
+                close()
+            except Exception as e:
+                raise OutputError(e) from e
+        if written:
+            try:
+                os.replace(temp, filename)
+            except OSError as e:
+                raise OutputError(e) from e
+    except OutputError as e:
+        print(f"Error saving to {label}: {e}")
+        if os.path.exists(temp):
+            keep_partial(temp, filename, written)
+        return 0
+    except BaseException:
+        keep_partial(temp, filename, written)
+        raise
+
+    if not written:
+        os.remove(temp)
+        return 0
+
+    print(f"Successfully saved {written} comments to {filename}")
+    return written
+
+
+async def save_comments_to_csv(comments, video_id, filename=None):
+    """
+    Streams comments to a CSV file as they are retrieved (see save_stream).
+
+    Args:
+        comments (async iterable): Comment dictionaries
+        video_id (str): YouTube video ID (used for default filename)
+        filename (str): Optional custom filename
+
+    Returns:
+        int: Number of comments saved
+    """
+    def open_sink(filename):
+        csvfile = open(filename, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        return writer.writerow, csvfile.close
+
+    return await save_stream(comments, filename or default_filename(video_id, 'csv'), 'CSV', open_sink)
+
+
+async def save_comments_to_jsonl(comments, video_id, filename=None):
+    """
+    Streams comments to a JSON Lines file (one JSON object per line) as they are retrieved
+    (see save_stream).
+
+    Args:
+        comments (async iterable): Comment dictionaries
+        video_id (str): YouTube video ID (used for default filename)
+        filename (str): Optional custom filename
+
+    Returns:
+        int: Number of comments saved
+    """
+    def open_sink(filename):
+        jsonlfile = open(filename, 'wb', buffering=WRITE_BUFFER_SIZE)
+        return (
+            lambda comment: jsonlfile.write(orjson.dumps(comment, option=orjson.OPT_APPEND_NEWLINE)),
+            jsonlfile.close
         )
-        
-        response = request.execute()
-        
-        for item in response['items']:
-            # Add top-level comment (level 0)
-            top_comment = item['snippet']['topLevelComment']['snippet']
-            comments.append({
-                'level': 0,
-                'author': top_comment['authorDisplayName'],
-                'comment': top_comment['textDisplay'],
-                'like_count': top_comment['likeCount'],
-                'published_at': top_comment['publishedAt'],
-                'updated_at': top_comment['updatedAt'],
-                'parent_id': '',
-                'comment_id': item['snippet']['topLevelComment']['id']
-            })
-            
-            # Add replies (level 1) if they exist
-            if 'replies' in item:
-                total_reply_count = item['snippet']['totalReplyCount']
-                
-                # Add the replies that come with the commentThread
-                for reply in item['replies']['comments']:
-                    reply_snippet = reply['snippet']
-                    comments.append({
-                        'level': 1,
-                        'author': reply_snippet['authorDisplayName'],
-                        'comment': reply_snippet['textDisplay'],
-                        'like_count': reply_snippet['likeCount'],
-                        'published_at': reply_snippet['publishedAt'],
-                        'updated_at': reply_snippet['updatedAt'],
-                        'parent_id': item['snippet']['topLevelComment']['id'],
-                        'comment_id': reply['id']
-                    })
-                
-                # If there are more replies than what came with the thread, fetch them
-                if total_reply_count > len(item['replies']['comments']):
-                    try:
-                        replies_request = youtube.comments().list(
-                            part='snippet',
-                            parentId=item['snippet']['topLevelComment']['id'],
-                            maxResults=100
-                        )
-                        replies_response = replies_request.execute()
-                        
-                        # Skip the replies we already have
-                        existing_reply_ids = {r['id'] for r in item['replies']['comments']}
-                        
-                        for reply in replies_response['items']:
-                            if reply['id'] not in existing_reply_ids:
-                                reply_snippet = reply['snippet']
-                                comments.append({
-                                    'level': 1,
-                                    'author': reply_snippet['authorDisplayName'],
-                                    'comment': reply_snippet['textDisplay'],
-                                    'like_count': reply_snippet['likeCount'],
-                                    'published_at': reply_snippet['publishedAt'],
-                                    'updated_at': reply_snippet['updatedAt'],
-                                    'parent_id': item['snippet']['topLevelComment']['id'],
-                                    'comment_id': reply['id']
-                                })
-                        
-                        # Handle pagination for replies if needed
-                        while 'nextPageToken' in replies_response:
-                            replies_request = youtube.comments().list(
-                                part='snippet',
-                                parentId=item['snippet']['topLevelComment']['id'],
-                                maxResults=100,
-                                pageToken=replies_response['nextPageToken']
-                            )
-                            replies_response = replies_request.execute()
-                            
-                            for reply in replies_response['items']:
-                                reply_snippet = reply['snippet']
-                                comments.append({
-                                    'level': 1,
-                                    'author': reply_snippet['authorDisplayName'],
-                                    'comment': reply_snippet['textDisplay'],
-                                    'like_count': reply_snippet['likeCount'],
-                                    'published_at': reply_snippet['publishedAt'],
-                                    'updated_at': reply_snippet['updatedAt'],
-                                    'parent_id': item['snippet']['topLevelComment']['id'],
-                                    'comment_id': reply['id']
-                                })
-                    except HttpError as reply_error:
-                        print(f"Warning: Could not fetch all replies for comment {item['snippet']['topLevelComment']['id']}: {reply_error}")
-                        continue
-            
-        # Handle pagination if there are more comments
-        while 'nextPageToken' in response and len([c for c in comments if c['level'] == 0]) < max_results:
-            request = youtube.commentThreads().list(
-                part='snippet,replies',
-                videoId=video_id,
-                maxResults=min(max_results - len([c for c in comments if c['level'] == 0]), 100),
-                order='relevance',
-                pageToken=response['nextPageToken']
-            )
-            response = request.execute()
-            
-            for item in response['items']:
-                # Add top-level comment (level 0)
-                top_comment = item['snippet']['topLevelComment']['snippet']
-                comments.append({
-                    'level': 0,
-                    'author': top_comment['authorDisplayName'],
-                    'comment': top_comment['textDisplay'],
-                    'like_count': top_comment['likeCount'],
-                    'published_at': top_comment['publishedAt'],
-                    'updated_at': top_comment['updatedAt'],
-                    'parent_id': '',
-                    'comment_id': item['snippet']['topLevelComment']['id']
-                })
-                
-                # Add replies (level 1) if they exist
-                if 'replies' in item:
-                    total_reply_count = item['snippet']['totalReplyCount']
-                    
-                    # Add the replies that come with the commentThread
-                    for reply in item['replies']['comments']:
-                        reply_snippet = reply['snippet']
-                        comments.append({
-                            'level': 1,
-                            'author': reply_snippet['authorDisplayName'],
-                            'comment': reply_snippet['textDisplay'],
-                            'like_count': reply_snippet['likeCount'],
-                            'published_at': reply_snippet['publishedAt'],
-                            'updated_at': reply_snippet['updatedAt'],
-                            'parent_id': item['snippet']['topLevelComment']['id'],
-                            'comment_id': reply['id']
-                        })
-                    
-                    # If there are more replies than what came with the thread, fetch them
-                    if total_reply_count > len(item['replies']['comments']):
-                        try:
-                            replies_request = youtube.comments().list(
-                                part='snippet',
-                                parentId=item['snippet']['topLevelComment']['id'],
-                                maxResults=100
-                            )
-                            replies_response = replies_request.execute()
-                            
-                            # Skip the replies we already have
-                            existing_reply_ids = {r['id'] for r in item['replies']['comments']}
-                            
-                            for reply in replies_response['items']:
-                                if reply['id'] not in existing_reply_ids:
-                                    reply_snippet = reply['snippet']
-                                    comments.append({
-                                        'level': 1,
-                                        'author': reply_snippet['authorDisplayName'],
-                                        'comment': reply_snippet['textDisplay'],
-                                        'like_count': reply_snippet['likeCount'],
-                                        'published_at': reply_snippet['publishedAt'],
-                                        'updated_at': reply_snippet['updatedAt'],
-                                        'parent_id': item['snippet']['topLevelComment']['id'],
-                                        'comment_id': reply['id']
-                                    })
-                            
-                            # Handle pagination for replies if needed
-                            while 'nextPageToken' in replies_response:
-                                replies_request = youtube.comments().list(
-                                    part='snippet',
-                                    parentId=item['snippet']['topLevelComment']['id'],
-                                    maxResults=100,
-                                    pageToken=replies_response['nextPageToken']
-                                )
-                                replies_response = replies_request.execute()
-                                
-                                for reply in replies_response['items']:
-                                    reply_snippet = reply['snippet']
-                                    comments.append({
-                                        'level': 1,
-                                        'author': reply_snippet['authorDisplayName'],
-                                        'comment': reply_snippet['textDisplay'],
-                                        'like_count': reply_snippet['likeCount'],
-                                        'published_at': reply_snippet['publishedAt'],
-                                        'updated_at': reply_snippet['updatedAt'],
-                                        'parent_id': item['snippet']['topLevelComment']['id'],
-                                        'comment_id': reply['id']
-                                    })
-                        except HttpError as reply_error:
-                            print(f"Warning: Could not fetch all replies for comment {item['snippet']['topLevelComment']['id']}: {reply_error}")
-                            continue
-                
-    except HttpError as e:
-        print(f"An HTTP error occurred: {e}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        sys.exit(1)
-        
-    return comments
 
+    return await save_stream(comments, filename or default_filename(video_id, 'jsonl'), 'JSONL', open_sink)
 
-def save_comments_to_csv(comments, video_id, filename=None):
+
+async def save_comments_to_parquet(comments, video_id, filename=None):
     """
-    Saves comments to a CSV file.
-    
+    Streams comments to a zstd-compressed Parquet file as they are retrieved (see save_stream).
+    Records are gathered into per-field column buffers (typed arrays for the integer
+    fields) and flushed as one row group every PARQUET_ROW_GROUP_SIZE comments.
+    Requires pyarrow.
+
     Args:
-        comments (list): List of comment dictionaries
+        comments (async iterable): Comment dictionaries
         video_id (str): YouTube video ID (used for default filename)
         filename (str): Optional custom filename
+
+    Returns:
+        int: Number of comments saved
     """
-    if not filename:
-        filename = f"youtube_comments_{video_id}.csv"
-    
     try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['level', 'author', 'comment', 'like_count', 'published_at', 'updated_at', 'parent_id', 'comment_id']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for comment in comments:
-                writer.writerow(comment)
-                
-        print(f"Successfully saved {len(comments)} comments to {filename}")
-        
-    except Exception as e:
-        print(f"Error saving to CSV: {e}")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Saving to Parquet requires pyarrow: pip install pyarrow")
         sys.exit(1)
 
+    schema = pa.schema([
+        ('level', pa.int8()),
+        ('author', pa.string()),
+        ('comment', pa.string()),
+        ('like_count', pa.int64()),
+        ('published_at', pa.string()),
+        ('updated_at', pa.string()),
+        ('parent_id', pa.string()),
+        ('comment_id', pa.string()),
+    ])
+
+    def new_columns():
+        # Integer columns are kept unboxed in typed arrays that Arrow can wrap without copying
+        columns = {name: [] for name in FIELDNAMES}
+        columns['level'] = array('b')
+        columns['like_count'] = array('q')
+        return columns
+
+    def to_arrow(name, column):
+        if isinstance(column, array):
+            return pa.Array.from_buffers(schema.field(name).type, len(column), [None, pa.py_buffer(column)])
+        return pa.array(column, type=schema.field(name).type)
+
+    columns = new_columns()
+
+    def flush(writer):
+        nonlocal columns
+        if columns['comment_id']:
+            writer.write_table(pa.Table.from_arrays(
+                [to_arrow(name, column) for name, column in columns.items()], schema=schema
+            ))
+            # Start fresh buffers rather than clearing: Arrow may still hold the old ones
+            columns = new_columns()
+
+    def open_sink(filename):
+        writer = pq.ParquetWriter(filename, schema, compression='zstd')
+
+        def write(comment):
+            for name, column in columns.items():
+                column.append(comment[name])
+            if len(columns['comment_id']) >= PARQUET_ROW_GROUP_SIZE:
+                flush(writer)
+
+        def close():
+            try:
+                flush(writer)
+            finally:
+                writer.close()
+
+        return write, close
+
+    return await save_stream(comments, filename or default_filename(video_id, 'parquet'), 'Parquet', open_sink)
+
+
+SAVERS = {
+    'jsonl': save_comments_to_jsonl,
+    'csv': save_comments_to_csv,
+    'parquet': save_comments_to_parquet,
+}
+
+
+def open_cache(directory):
+    """
+    Opens the on-disk API response cache. Requires diskcache.
+    """
+    try:
+        from diskcache import Cache
+    except ImportError:
+        print("Caching API responses requires diskcache: pip install diskcache")
+        sys.exit(1)
+    return Cache(directory)
+
+
+def run_one(api_key, video_id, max_results, requests_per_second, output_format, filename=None, cache_dir=None,
+            include_replies=False):
+    """
+    Extracts the comments of one video and saves them in the given format.
+    Also used as the per-process entry point when several videos are extracted.
+
+    Returns:
+        int: Number of comments saved, 0 if the extraction failed
+    """
+    cache = open_cache(cache_dir) if cache_dir else None
+    try:
+        comments = get_video_comments(api_key, video_id, max_results, requests_per_second, cache=cache,
+                                      include_replies=include_replies)
+        return asyncio.run(SAVERS[output_format](comments, video_id, filename))
+    except aiohttp.ClientResponseError as e:
+        if is_quota_exceeded(e):
+            print("The YouTube Data API daily quota is used up; try again once it resets.")
+        else:
+            print(f"An HTTP error occurred: {describe_error(e)}")
+        return 0
+    except Exception as e:
+        # Network failures and unexpected responses (e.g. a page that is not JSON)
+        print(f"An error occurred: {describe_error(e)}")
+        return 0
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def run_many(api_key, video_ids, max_results, requests_per_second, output_format, cache_dir=None,
+             include_replies=False):
+    """
+    Extracts several videos in parallel, one worker process per CPU, each saving
+    its video to its own youtube_comments_<video_id> file. The request rate is
+    split evenly across the workers so the total stays within requests_per_second.
+    A worker that dies mid-write cannot clean up after itself, so its temporary file is removed.
+
+    Returns:
+        list: Video IDs for which no comments could be saved
+    """
+    workers = min(os.cpu_count() or 1, len(video_ids))
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_one, api_key, video_id, max_results, requests_per_second / workers,
+                        output_format, None, cache_dir, include_replies): video_id
+            for video_id in video_ids
+        }
+        for future in as_completed(futures):
+            try:
+                count = future.result()
+            # A missing optional dependency ends a worker through sys.exit, which must not take down the others
+            except (Exception, SystemExit) as e:
+                print(f"Error extracting video {futures[future]}: {e!r}")
+                count = 0
+            if not count:
+                failed.append(futures[future])
+                temp = temp_filename(default_filename(futures[future], output_format))
+                if os.path.exists(temp):
+                    os.remove(temp)
+
+    return failed
+
+
+def read_video_ids(filename):
+    """
+    Reads video IDs from a file, one per line; blank lines and lines starting with # are skipped.
+    """
+    with open(filename, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
 
 def main():
-    parser = argparse.ArgumentParser(description='Extract YouTube comments and save to CSV')
+    parser = argparse.ArgumentParser(description='Extract YouTube comments and save to JSONL, CSV or Parquet')
     parser.add_argument('api_key', help='YouTube Data API key')
-    parser.add_argument('video_id', help='YouTube video ID')
-    parser.add_argument('--max-comments', type=int, default=100, 
+    parser.add_argument('video_id', nargs='?', help='YouTube video ID')
+    parser.add_argument('--video-ids', metavar='FILE',
+                       help='File with one video ID per line, extracted in parallel instead of video_id')
+    parser.add_argument('--max-comments', type=int, default=100,
                        help='Maximum number of comments to extract (default: 100)')
-    parser.add_argument('--output', '-o', help='Output CSV filename')
-    
+    parser.add_argument('--include-replies', action='store_true',
+                       help='Also extract the replies to each comment')
+    parser.add_argument('--output', '-o', help='Output filename')
+    parser.add_argument('--format', choices=list(SAVERS), default='jsonl',
+                       help='Output format (default: jsonl)')
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND,
+                       help=f'Maximum API requests per second (default: {REQUESTS_PER_SECOND})')
+    parser.add_argument('--cache-dir',
+                       help=f'Cache API responses in this directory for {CACHE_TTL} seconds')
+
     args = parser.parse_args()
-    
+
+    if args.rate <= 0:
+        parser.error('--rate must be greater than 0')
+    if bool(args.video_id) == bool(args.video_ids):
+        parser.error('give either video_id or --video-ids')
+    if args.video_ids and args.output:
+        parser.error('--output cannot be combined with --video-ids; each video is saved to its own file')
+
+    if args.video_ids:
+        video_ids = read_video_ids(args.video_ids)
+        if not video_ids:
+            parser.error(f'no video IDs found in {args.video_ids}')
+        print(f"Extracting comments from {len(video_ids)} videos")
+        print(f"Maximum comments: {args.max_comments}")
+
+        failed = run_many(args.api_key, video_ids, args.max_comments, args.rate, args.format, args.cache_dir,
+                          args.include_replies)
+        if failed:
+            print(f"No comments saved for: {', '.join(failed)}")
+            sys.exit(1)
+        return
+
     print(f"Extracting comments from video: {args.video_id}")
     print(f"Maximum comments: {args.max_comments}")
-    
-    comments = get_video_comments(args.api_key, args.video_id, args.max_comments)
-    
-    if not comments:
+
+    count = run_one(args.api_key, args.video_id, args.max_comments, args.rate, args.format, args.output, args.cache_dir,
+                    args.include_replies)
+
+    if not count:
         print("No comments found or unable to retrieve comments.")
         sys.exit(1)
-    
-    save_comments_to_csv(comments, args.video_id, args.output)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()